@@ -0,0 +1,166 @@
+import json
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from helpers.sexpr_converter import alpha_normalize, parse_sexpr, unparse_sexpr
+
+# MORK pattern/template pair selecting the (fired <step> <src> <goal> <subgoal>)
+# atoms left behind by mm2/chainer_profile.mm2.
+FIRED_PATTERN = "[5] fired $ $ $ $"
+FIRED_TEMPLATE = "[5] fired _1 _2 _3 _4"
+
+QUERY_SOURCE = "<query>"
+
+
+def statement_name(atom: str) -> str:
+    """Return the proof name of a (: name type tv) statement, or the atom itself."""
+    parsed, _ = parse_sexpr(atom, 0)
+    if parsed[0] == 'list' and len(parsed[1]) == 4 and parsed[1][0] == ('atom', ':'):
+        return unparse_sexpr(parsed[1][1])
+    return atom
+
+
+def group_sources(sources: List[Tuple[str, str]]) -> List[Tuple[str, List[str]]]:
+    """Collapse (statement name, compiled atom) pairs into (atom, statement names).
+
+    MORK stores atoms as a set, so statements compiling to the same atom (up
+    to variable names) share one atom and one firing; the profiling run must
+    see a single (src ...) atom for it as well.
+    """
+    groups: Dict[str, Tuple[str, List[str]]] = {}
+    for name, atom in sources:
+        atom_names = groups.setdefault(alpha_normalize(atom), (atom, []))[1]
+        if name not in atom_names:
+            atom_names.append(name)
+    return list(groups.values())
+
+
+def src_atoms(groups: List[Tuple[str, List[str]]]) -> List[str]:
+    """Wrap every distinct compiled atom as (src <idx> <atom>) for the profiling chainer."""
+    return [f"(src {idx} {atom})" for idx, (atom, _names) in enumerate(groups)]
+
+
+class ChainerProfile:
+    """Firing statistics for a single profiled query.
+
+    Counts are over distinct firings: MORK stores atoms as a set, so the same
+    step applied to the same goal with the same source is only seen once.
+    A firing whose atom came from several statements is labelled with all of
+    their names joined by "|" and counts once for each of them in
+    rule_counts. Functions run by cpu steps are counted in function_counts.
+    """
+
+    def __init__(self, query: str, compile_time: float, run_time: float):
+        self.query = query
+        self.compile_time = compile_time
+        self.run_time = run_time
+        self.step_counts: Counter = Counter()
+        self.rule_counts: Counter = Counter()
+        self.function_counts: Counter = Counter()
+        self.fanout: Dict[str, int] = defaultdict(int)
+        self.rule_fanout: Dict[str, int] = defaultdict(int)
+        self.firings: List[Tuple[str, str, str, Optional[str]]] = []
+
+    @classmethod
+    def from_trace(cls, query: str, lines: List[str], groups: List[Tuple[str, List[str]]],
+                   compile_time: float = 0.0, run_time: float = 0.0) -> "ChainerProfile":
+        """Build a profile from the fired atoms written by a profiling run
+
+        Args:
+            query: The profiled query
+            lines: Output lines of the profiling run, one fired atom per line
+            groups: (compiled atom, statement names) pairs from group_sources,
+                indexed like the src atoms
+            compile_time: Seconds spent in mm2compileQuery
+            run_time: Seconds spent in the unprofiled mork run
+
+        Returns:
+            The populated ChainerProfile
+        """
+        profile = cls(query, compile_time, run_time)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            parsed, _ = parse_sexpr(line, 0)
+            if parsed[0] != 'list' or len(parsed[1]) != 5:
+                continue
+            _fired, step, src, goal, subgoal = (unparse_sexpr(e) for e in parsed[1])
+            # Variable names depend on where a goal sits in the fired atom, so
+            # normalize them before goals and subgoals are matched up
+            profile._add(step, src, profile._source_names(step, src, groups), alpha_normalize(goal),
+                         None if subgoal == '-' else alpha_normalize(subgoal))
+        return profile
+
+    @staticmethod
+    def _source_names(step: str, src: str, groups: List[Tuple[str, List[str]]]) -> List[str]:
+        if src == '-' or step == 'cpu':
+            return []
+        try:
+            return groups[int(src)][1]
+        except (ValueError, IndexError):
+            return [src]
+
+    def _add(self, step: str, src: str, names: List[str], goal: str, subgoal: Optional[str]):
+        if step == 'cpu':
+            source = src
+            self.function_counts[src] += 1
+        else:
+            source = "|".join(names) if names else None
+            self.rule_counts.update(names)
+        self.firings.append((step, source, goal, subgoal))
+        self.step_counts[step] += 1
+        if subgoal is not None:
+            self.fanout[goal] += 1
+            self.rule_fanout[self._label(step, source)] += 1
+
+    @staticmethod
+    def _label(step: str, source: Optional[str]) -> str:
+        return step if source is None else f"{step}:{source}"
+
+    def folded_stacks(self) -> Counter:
+        """Collapse firings into flamegraph stacks, following goal -> subgoal edges"""
+        producer = {}
+        for step, source, goal, subgoal in self.firings:
+            if subgoal is not None and subgoal not in producer:
+                producer[subgoal] = (self._label(step, source), goal)
+
+        stacks: Counter = Counter()
+        for step, source, goal, _subgoal in self.firings:
+            frames = [self._label(step, source)]
+            seen = {goal}
+            cur = goal
+            while cur in producer:
+                label, parent = producer[cur]
+                frames.append(label)
+                if parent in seen:
+                    break
+                seen.add(parent)
+                cur = parent
+            frames.append("query")
+            stacks[";".join(f.replace(";", ",") for f in reversed(frames))] += 1
+        return stacks
+
+    def to_dict(self) -> dict:
+        return {
+            "query": self.query,
+            "compile_time": self.compile_time,
+            "run_time": self.run_time,
+            "firings": len(self.firings),
+            "steps": dict(self.step_counts.most_common()),
+            "rules": dict(self.rule_counts.most_common()),
+            "functions": dict(self.function_counts.most_common()),
+            "rule_fanout": dict(sorted(self.rule_fanout.items(), key=lambda kv: -kv[1])),
+            "goals": len(self.fanout),
+            "max_fanout": max(self.fanout.values(), default=0),
+            "goal_fanout": dict(sorted(self.fanout.items(), key=lambda kv: -kv[1])),
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in sorted(self.folded_stacks().items()):
+                f.write(f"{stack} {count}\n")
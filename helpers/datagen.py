@@ -1,259 +1,288 @@
 #!/usr/bin/env python3
 """
-Synthetic ATP data generator.
-
-Emits S-expr style facts/rules like:
-  (Implication (Animal $x) (Dog $x) (STV 0.73 0.92))
-  (Implication (Dog $x) (ShortHair $x) (STV 0.61 0.85))
-  (Dog dog1)
-  (ShortHair dog1)
+Synthetic ATP workload generator.
+
+Emits a layered KB of S-expr statements in the format accepted by
+MorkHandler.add_atom:
+  (: rule-0003 (Implication (And (P0_1 $x) (P0_4 $x)) (P1_0 $x)) (STV 0.73 0.92))
+  (: rule-0004 (Implication (Or (P1_0 $x) (P1_2 $x)) (P2_1 $x)) (STV 0.61 0.85))
+  (: fact-12-P0_3 (P0_3 ind12) (STV 0.97 0.93))
+
+Layer 0 predicates are asserted as facts for individuals; every predicate in
+layer k > 0 is concluded by one rule whose body draws on layer k - 1 (and
+optionally lower layers), so --depth controls the length of inference
+chains. Facts are generated per individual from a seed derived from
+(--seed, individual), which keeps memory constant in --individuals and
+lets the expected answers be recomputed while writing the query file.
+
+Optionally emits a JSON lines query file with the expected answers:
+  {"query": "(: $prf (P2_1 ind7) $tv)", "kind": "ground", "expected": true}
+  {"query": "(: $prf (P2_1 $x) $tv)", "kind": "open", "count": 3, "expected": ["ind2", ...]}
+
+Expected answers treat the KB as crisp: a statement is expected to be
+provable iff it follows from the emitted facts, ignoring STV values. They
+follow what metta/compile.metta can prove, so an (Or ...) premise only
+holds when every disjunct is proven, just like (And ...).
 
 Usage:
-  python gen_atp_data.py > kb.nal
+  python helpers/datagen.py --individuals 1000000 --depth 6 \\
+      --queries queries.jsonl > kb.metta
 """
 
+import argparse
+import json
 import random
-from typing import List, Tuple
-
-# --------------------------
-# CONFIG
-# --------------------------
-SEED = 42
-
-# Number of distinct animal subtypes (besides the generic 'Animal')
-NUM_SUBTYPES = 8
-
-# Number of distinct properties to scatter across subtypes
-NUM_PROPERTIES = 50
-
-# How many properties each subtype tends to “imply”
-PROPS_PER_SUBTYPE_MIN = 5
-PROPS_PER_SUBTYPE_MAX = 10
-
-# Number of individuals to generate
-NUM_INDIVIDUALS = 50
-
-# Chance an individual gets an explicit subtype fact (beyond just Animal)
-# When chosen, which subtype(s) are added depends on the Animal->Subtype STV
-SUBTYPE_FACT_RATE = 0.85   # 0..1
-
-# Chance to emit a property fact for an individual given (Subtype x)
-# This is scaled by the subtype->property STV "strength"
-BASE_PROPERTY_FACT_RATE = 0.8  # 0..1
+import sys
+from typing import Iterator, List, Optional, Set, TextIO, Tuple
 
 # Ranges for generating STV strengths/confidences
 # (strength ~ how often the rule holds; confidence ~ reliability of that estimate)
 STRENGTH_RANGE = (0.5, 0.95)
 CONFIDENCE_RANGE = (0.7, 0.99)
 
-# Optional: add a small fraction of contradictory/noisy property facts
-NOISE_PROPERTY_RATE = 0.03  # probability to flip/include a property contrary to expectations
-
-# Optional: deterministic, readable predicate name seeds
-SUBTYPE_SEED_WORDS = [
-    "Dog", "Cat", "Horse", "Bird", "Rabbit", "Sheep", "Goat", "Cow",
-    "Pig", "Wolf", "Fox", "Bear", "Deer", "Lion", "Tiger", "Dolphin",
-]
-PROPERTY_SEED_WORDS = [
-    "ShortHair", "LongHair", "Brown", "Black", "White", "Spotted", "Striped",
-    "HasTail", "HasHorns", "Nocturnal", "Aquatic", "FastRunner", "Barks",
-    "Meows", "Claws", "Hooved",
-]
+# Spreads individual seeds apart so neighbouring individuals get unrelated streams
+SEED_STRIDE = 2654435761
 
 # --------------------------
 # HELPER GENERATION
 # --------------------------
 
-def sample_stv() -> Tuple[float, float]:
-    s = random.uniform(*STRENGTH_RANGE)
-    c = random.uniform(*CONFIDENCE_RANGE)
+def sample_stv(rng: random.Random) -> Tuple[float, float]:
+    s = rng.uniform(*STRENGTH_RANGE)
+    c = rng.uniform(*CONFIDENCE_RANGE)
     return round(s, 2), round(c, 2)
 
-def choose_names(seed_words: List[str], n: int) -> List[str]:
-    # deterministically pick n distinct names, falling back to generated ones
-    pool = seed_words[:]
-    random.shuffle(pool)
-    names = pool[: min(n, len(pool))]
-    while len(names) < n:
-        names.append(f"Type{len(names)+1}")
-    return names
-
-def unique_pairs(xs: List[str], k_min: int, k_max: int) -> List[Tuple[str, List[str]]]:
-    """For each x in xs pick between k_min..k_max distinct partners from a global property list later."""
-    # This helper just allocates counts; actual property binding is later.
-    result = []
-    for x in xs:
-        k = random.randint(k_min, k_max)
-        result.append((x, k))
-    return result
-
-def sample_categorical_strengths(labels: List[str], concentration: float = 1.5) -> List[Tuple[str, float]]:
-    """Sample a categorical distribution over labels that sums to 1.0 (within rounding)."""
-    if not labels:
-        return []
-    weights = [random.gammavariate(concentration, 1.0) for _ in labels]
-    total = sum(weights)
-    if total == 0:
-        # degenerate case; fall back to uniform
-        strengths = [1.0 / len(labels)] * len(labels)
-    else:
-        strengths = [w / total for w in weights]
-
-    # Snap to two decimal places while keeping the distribution normalized.
-    ints = [max(1, round(s * 100)) for s in strengths]
-    total_int = sum(ints)
-
-    # Reduce any surplus while keeping probabilities >= 0.01
-    while total_int > 100:
-        idx = max(
-            (i for i in range(len(ints)) if ints[i] > 1),
-            key=lambda i: ints[i],
-            default=None,
-        )
-        if idx is None:
-            break
-        ints[idx] -= 1
-        total_int -= 1
-
-    # Distribute any deficit starting with the smallest entries
-    while total_int < 100:
-        idx = min(range(len(ints)), key=lambda i: ints[i])
-        ints[idx] += 1
-        total_int += 1
-
-    strengths = [i / 100 for i in ints]
-    return list(zip(labels, strengths))
-
-def sample_fact_stv(strength_hint: float = 0.95, conf_hint: float = 0.9, spread: float = 0.05) -> Tuple[float, float]:
+def sample_fact_stv(rng: random.Random, strength_hint: float = 0.95, conf_hint: float = 0.9, spread: float = 0.05) -> Tuple[float, float]:
     """Generate an STV for ground facts, centered around the provided hints."""
-    strength = max(0.01, min(0.99, random.gauss(strength_hint, spread)))
-    confidence = max(0.5, min(0.99, random.gauss(conf_hint, spread)))
+    strength = max(0.01, min(0.99, rng.gauss(strength_hint, spread)))
+    confidence = max(0.5, min(0.99, rng.gauss(conf_hint, spread)))
     return round(strength, 2), round(confidence, 2)
 
+def fmt_stv(stv: Tuple[float, float]) -> str:
+    return f"(STV {stv[0]:.2f} {stv[1]:.2f})"
+
+def individual(i: int) -> str:
+    return f"ind{i}"
+
 # --------------------------
-# MAIN GENERATION
+# WORKLOAD
 # --------------------------
 
-def main():
-    random.seed(SEED)
-
-    # 1) Define predicates
-    subtypes = choose_names(SUBTYPE_SEED_WORDS, NUM_SUBTYPES)
-    properties = choose_names(PROPERTY_SEED_WORDS, NUM_PROPERTIES)
-
-    # 2) Create Animal -> Subtype implication rules with STVs
-    animal_to_subtype_rules = []
-    for t, s in sample_categorical_strengths(subtypes):
-        c = round(random.uniform(*CONFIDENCE_RANGE), 2)
-        animal_to_subtype_rules.append((t, s, c))
-
-    # 3) For each subtype, assign 2..4 properties and make Subtype -> Property implication rules
-    subtype_prop_counts = unique_pairs(subtypes, PROPS_PER_SUBTYPE_MIN, PROPS_PER_SUBTYPE_MAX)
-
-    # distribute properties roughly evenly but randomly
-    props_queue = properties[:]
-    random.shuffle(props_queue)
-    subtype_to_props = {}
-    for t, k in subtype_prop_counts:
-        if k >= len(props_queue):  # recycle if exhausted
-            props_queue = properties[:]
-            random.shuffle(props_queue)
-        chosen = random.sample(props_queue, k)
-        subtype_to_props[t] = chosen
-
-    subtype_to_prop_rules = []  # list of (subtype, property, s, c)
-    for t, props in subtype_to_props.items():
-        for p in props:
-            s, c = sample_stv()
-            subtype_to_prop_rules.append((t, p, s, c))
-
-    # 4) Emit RULES
-    print("; ---------------------")
-    print("; RULES: Animal -> Subtype typicality")
-    print("; ---------------------")
-    print()
-    for idx, (t, s, c) in enumerate(animal_to_subtype_rules, 1):
-        rule_name = f"rule-animal-{idx:02d}"
-        expr = f"(Implication (Animal $x) ({t} $x))"
-        expr2 = f"(Implication ({t} $x) (Animal $x))"
-        print(f"(: {rule_name} {expr} (STV {s:.2f} {c:.2f}))")
-        print(f"(: {rule_name}_inverse {expr} (STV 1.0 1.0))")
-
-    print()
-    print("; ---------------------")
-    print("; RULES: Subtype -> Property typicality")
-    print("; ---------------------")
-    print()
-    for idx, (t, p, s, c) in enumerate(subtype_to_prop_rules, 1):
-        rule_name = f"rule-prop-{idx:03d}"
-        expr = f"(Implication ({t} $x) ({p} $x))"
-        print(f"(: {rule_name} {expr} (STV {s:.2f} {c:.2f}))")
-
-    # 5) Generate individuals & ground facts
-    # Strategy:
-    #   - Always assert (Animal ai)
-    #   - With probability SUBTYPE_FACT_RATE, sample exactly one subtype for ai based on the
-    #       categorical Animal->Subtype strengths (they sum to 1.0).
-    #   - For each asserted subtype, add properties based on its Subtype->Property strengths,
-    #       scaled by BASE_PROPERTY_FACT_RATE.
-    #   - Add a small amount of noise property facts.
-    print()
-    print("; ---------------------")
-    print("; FACTS: Individuals")
-    print("; ---------------------")
-
-    # Precompute maps for quick sampling
-    subtype_strength = {t: s for t, s, _c in animal_to_subtype_rules}
-    subtype_props = {t: [] for t in subtypes}
-    for t, p, s, c in subtype_to_prop_rules:
-        subtype_props[t].append((p, s))
-    subtype_weights = [subtype_strength[t] for t in subtypes]
-
-    individuals = []
-    for i in range(1, NUM_INDIVIDUALS + 1):
-        # give some readable names: a mix of 'dogN', subtypeN, or generic aN
-        if i <= len(subtypes):
-            name = f"{subtypes[i-1].lower()}{i}"
+class Rule:
+    """Rule concluding `head` from `body` joined by `connective` (None for a single premise).
+
+    Body elements are predicate names, or ("nested", bridge) for an
+    (Implication (A $x) (bridge $x)) premise whose bridge rule is emitted alongside.
+    """
+
+    def __init__(self, name: str, head: str, connective: Optional[str], body: list, stv: Tuple[float, float]):
+        self.name = name
+        self.head = head
+        self.connective = connective
+        self.body = body
+        self.stv = stv
+
+class Workload:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        rng = random.Random(args.seed)
+
+        # 1) Split predicates into depth + 1 layers, spare ones go to the fact layer
+        per_layer = args.predicates // (args.depth + 1)
+        sizes = [per_layer] * (args.depth + 1)
+        sizes[0] += args.predicates - per_layer * (args.depth + 1)
+        self.layers = [[f"P{k}_{j}" for j in range(n)] for k, n in enumerate(sizes)]
+
+        # 2) One rule per derived predicate
+        self.rules: List[Rule] = []
+        self.bridges: List[Tuple[str, str, Tuple[float, float]]] = []  # (bridge, source, stv)
+        for k in range(1, len(self.layers)):
+            lower = [p for layer in self.layers[:k] for p in layer]
+            for head in self.layers[k]:
+                self.rules.append(self._make_rule(rng, head, self.layers[k - 1], lower))
+
+        # 3) Per-predicate fact rate for the fact layer
+        self.fact_rates = {p: rng.uniform(args.fact_rate_min, args.fact_rate_max) for p in self.layers[0]}
+
+    def _make_rule(self, rng: random.Random, head: str, prev: List[str], lower: List[str]) -> Rule:
+        fanin = min(rng.randint(self.args.fanin_min, self.args.fanin_max), len(lower))
+        # The first premise comes from the previous layer so the head really sits at depth k
+        first = rng.choice(prev)
+        rest = rng.sample([p for p in lower if p != first], fanin - 1)
+        body: list = [first] + rest
+        if fanin == 1:
+            connective = None
+        elif rng.random() < self.args.or_rate:
+            connective = "Or"
         else:
-            name = f"a{i}"
-        individuals.append(name)
-
-    fact_counter = 1
-
-    print()
-    for name in individuals:
-        stv_animal = sample_fact_stv(0.99, 0.95, 0.01)
-        print(f"(: fact-{fact_counter:04d} (Animal {name}) (STV {stv_animal[0]:.2f} {stv_animal[1]:.2f}))")
-        fact_counter += 1
-
-        chosen_subtypes = []
-        if random.random() < SUBTYPE_FACT_RATE:
-            chosen_subtype = random.choices(subtypes, weights=subtype_weights, k=1)[0]
-            chosen_subtypes.append(chosen_subtype)
-
-        # Ensure at least one subtype sometimes, but not always, to keep variety
-        if not chosen_subtypes and random.random() < 0.4:
-            chosen_subtypes.append(random.choices(subtypes, weights=subtype_weights, k=1)[0])
-
-        for t in chosen_subtypes:
-            stv_subtype = sample_fact_stv(subtype_strength[t], 0.9, 0.04)
-            print(f"(: fact-{fact_counter:04d} ({t} {name}) (STV {stv_subtype[0]:.2f} {stv_subtype[1]:.2f}))")
-            fact_counter += 1
-            # properties implied by this subtype
-            for (p, s_prop) in subtype_props.get(t, []):
-                emit_p = BASE_PROPERTY_FACT_RATE * s_prop
-                if random.random() < emit_p:
-                    stv_prop = sample_fact_stv(s_prop, 0.85, 0.05)
-                    print(f"(: fact-{fact_counter:04d} ({p} {name}) (STV {stv_prop[0]:.2f} {stv_prop[1]:.2f}))")
-                    fact_counter += 1
-
-        # Noise properties (picked from global set)
-        if random.random() < NOISE_PROPERTY_RATE:
-            p = random.choice(properties)
-            # avoid duplicating if it was already emitted; still okay if it is
-            stv_noise = sample_fact_stv(0.3, 0.6, 0.08)
-            print(f"(: fact-{fact_counter:04d} ({p} {name}) (STV {stv_noise[0]:.2f} {stv_noise[1]:.2f}))")
-            fact_counter += 1
+            connective = "And"
+            # Nested premises are always provable, so keep at least one plain conjunct
+            for idx in range(1, fanin):
+                if rng.random() < self.args.nested_rate:
+                    bridge = f"Bridge{len(self.bridges)}"
+                    self.bridges.append((bridge, body[idx], sample_stv(rng)))
+                    body[idx] = ("nested", bridge)
+        return Rule(f"rule-{len(self.rules):04d}", head, connective, body, sample_stv(rng))
+
+    def _bridge_source(self, bridge: str) -> str:
+        return self.bridges[int(bridge[len("Bridge"):])][1]
+
+    def _premise(self, elem) -> str:
+        if isinstance(elem, tuple):
+            bridge = elem[1]
+            return f"(Implication ({self._bridge_source(bridge)} $x) ({bridge} $x))"
+        return f"({elem} $x)"
+
+    def rule_exprs(self) -> Iterator[str]:
+        for bridge, source, stv in self.bridges:
+            yield f"(: rule-{bridge.lower()} (Implication ({source} $x) ({bridge} $x)) {fmt_stv(stv)})"
+        for rule in self.rules:
+            premises = [self._premise(e) for e in rule.body]
+            body = premises[0] if rule.connective is None else f"({rule.connective} {' '.join(premises)})"
+            yield f"(: {rule.name} (Implication {body} ({rule.head} $x)) {fmt_stv(rule.stv)})"
+        if self.args.recursion:
+            yield "(: rule-reach-base (Implication (Link $x $y) (Reach $x $y)) (STV 1.0 1.0))"
+            yield "(: rule-reach-step (Implication (And (Link $x $y) (Reach $y $z)) (Reach $x $z)) (STV 1.0 1.0))"
+
+    def facts(self, i: int) -> List[Tuple[str, Tuple[float, float]]]:
+        """Fact-layer predicates asserted for individual i, with their STVs"""
+        rng = random.Random(self.args.seed * SEED_STRIDE + i)
+        result = []
+        for p in self.layers[0]:
+            if rng.random() < self.fact_rates[p]:
+                result.append((p, sample_fact_stv(rng)))
+        return result
+
+    def holds(self, i: int) -> Set[str]:
+        """All predicates expected to be provable for individual i"""
+        truth = {p for p, _stv in self.facts(i)}
+        for rule in self.rules:  # rules are ordered by layer
+            # The compiler builds Or like And from all disjuncts (inTemplate), so both need every premise
+            if all(isinstance(e, tuple) or e in truth for e in rule.body):
+                truth.add(rule.head)
+        return truth
+
+    # Recursion: individuals form Link chains of --chain-length, Reach is their transitive closure
+
+    def link_facts(self, i: int) -> Iterator[str]:
+        if self.args.recursion and (i + 1) % self.args.chain_length != 0 and i + 1 < self.args.individuals:
+            yield f"(: link-{i} (Link {individual(i)} {individual(i + 1)}) (STV 1.0 1.0))"
+
+    def reachable(self, i: int) -> List[int]:
+        chain_end = min((i // self.args.chain_length + 1) * self.args.chain_length, self.args.individuals)
+        return list(range(i + 1, chain_end))
+
+# --------------------------
+# OUTPUT
+# --------------------------
+
+def write_kb(workload: Workload, out: TextIO):
+    print("; ---------------------", file=out)
+    print("; RULES", file=out)
+    print("; ---------------------", file=out)
+    for expr in workload.rule_exprs():
+        print(expr, file=out)
+
+    print(file=out)
+    print("; ---------------------", file=out)
+    print("; FACTS: Individuals", file=out)
+    print("; ---------------------", file=out)
+    for i in range(workload.args.individuals):
+        name = individual(i)
+        for p, stv in workload.facts(i):
+            print(f"(: fact-{i}-{p} ({p} {name}) {fmt_stv(stv)})", file=out)
+        for expr in workload.link_facts(i):
+            print(expr, file=out)
+
+def open_answers(workload: Workload, pred: str, limit: int) -> Tuple[int, Optional[List[str]]]:
+    count = 0
+    answers: Optional[List[str]] = []
+    for i in range(workload.args.individuals):
+        if pred in workload.holds(i):
+            count += 1
+            if answers is not None:
+                answers.append(individual(i))
+                if len(answers) > limit:
+                    answers = None
+    return count, answers
+
+def write_queries(workload: Workload, out: TextIO):
+    args = workload.args
+    rng = random.Random(args.seed + 1)
+    derived = [p for layer in workload.layers[1:] for p in layer] or workload.layers[0]
+
+    for _ in range(args.ground_queries):
+        pred = rng.choice(derived)
+        i = rng.randrange(args.individuals)
+        entry = {"query": f"(: $prf ({pred} {individual(i)}) $tv)", "kind": "ground",
+                 "expected": pred in workload.holds(i)}
+        print(json.dumps(entry), file=out)
+
+    for pred in rng.sample(derived, min(args.open_queries, len(derived))):
+        count, answers = open_answers(workload, pred, args.max_answers)
+        entry = {"query": f"(: $prf ({pred} $x) $tv)", "kind": "open", "count": count}
+        if answers is not None:
+            entry["expected"] = answers
+        print(json.dumps(entry), file=out)
+
+    if args.recursion:
+        for _ in range(args.ground_queries):
+            i = rng.randrange(args.individuals)
+            reach = workload.reachable(i)
+            entry = {"query": f"(: $prf (Reach {individual(i)} $y) $tv)", "kind": "open",
+                     "count": len(reach), "expected": [individual(j) for j in reach]}
+            print(json.dumps(entry), file=out)
+
+# --------------------------
+# MAIN
+# --------------------------
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a synthetic KB and matching queries.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--individuals", type=int, default=50, help="number of individuals")
+    parser.add_argument("--predicates", type=int, default=24, help="number of unary predicates")
+    parser.add_argument("--depth", type=int, default=3, help="number of derived rule layers")
+    parser.add_argument("--fanin-min", type=int, default=1, help="minimum premises per rule")
+    parser.add_argument("--fanin-max", type=int, default=3, help="maximum premises per rule")
+    parser.add_argument("--or-rate", type=float, default=0.3, help="chance a multi-premise rule uses Or instead of And")
+    parser.add_argument("--nested-rate", type=float, default=0.0, help="chance an And premise is a nested Implication")
+    parser.add_argument("--fact-rate-min", type=float, default=0.2)
+    parser.add_argument("--fact-rate-max", type=float, default=0.8)
+    parser.add_argument("--recursion", action="store_true", help="add Link chains and a recursive Reach rule")
+    parser.add_argument("--chain-length", type=int, default=8, help="individuals per Link chain")
+    parser.add_argument("-o", "--output", help="KB output file (default: stdout)")
+    parser.add_argument("--queries", help="write JSON lines queries with expected answers to this file")
+    parser.add_argument("--ground-queries", type=int, default=20)
+    parser.add_argument("--open-queries", type=int, default=5)
+    parser.add_argument("--max-answers", type=int, default=1000, help="omit expected answer lists longer than this")
+    args = parser.parse_args(argv)
+
+    if args.individuals < 1:
+        parser.error("--individuals must be at least 1")
+    if args.depth < 0:
+        parser.error("--depth must not be negative")
+    if args.predicates < args.depth + 1:
+        parser.error("--predicates must be at least --depth + 1")
+    if not 1 <= args.fanin_min <= args.fanin_max:
+        parser.error("need 1 <= --fanin-min <= --fanin-max")
+    if args.chain_length < 2:
+        parser.error("--chain-length must be at least 2")
+    return args
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    workload = Workload(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            write_kb(workload, f)
+    else:
+        write_kb(workload, sys.stdout)
+
+    if args.queries:
+        with open(args.queries, "w") as f:
+            write_queries(workload, f)
 
 if __name__ == "__main__":
     main()
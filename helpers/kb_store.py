@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+from collections import Counter
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class KBSnapshot:
+    """Immutable view of a KBStore, released when leaving the with block."""
+
+    def __init__(self, store: "KBStore", files: Tuple[str, ...], version: int, num_sources: int):
+        self.store = store
+        self.files = files
+        self.version = version
+        self.num_sources = num_sources
+
+    def sources(self) -> List[Tuple[str, str]]:
+        return self.store.sources[:self.num_sources]
+
+    def __enter__(self) -> "KBSnapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.store.release(self)
+
+
+class KBStore:
+    """Append-only KB kept as a list of mm2 segment files.
+
+    Writers append to an active segment that readers never see. Taking a
+    snapshot seals the active segment, so every snapshot only references
+    files that are no longer written to and a mork run can read them while
+    further atoms are added. Once more than max_segments are sealed, the
+    writer merges the newest small segments after its append, so readers
+    never wait on a merge and large segments are rarely rewritten.
+    Merged-away files are deleted when the last snapshot using them is
+    released.
+    """
+
+    def __init__(self, prefix: str, max_segments: int = 16):
+        self.prefix = prefix
+        self.max_segments = max_segments
+        # (statement name, compiled atom) for every atom in the store, append-only
+        self.sources: List[Tuple[str, str]] = []
+        self.version = 0
+        self._lock = threading.Lock()
+        self._segments: List[str] = []
+        self._active: Optional[str] = None
+        self._next_segment = 0
+        self._refs: Counter = Counter()
+        self._retired = set()
+        self._compacting = False
+
+    def _new_path(self) -> str:
+        path = f"{self.prefix}_{self._next_segment}.mm2"
+        self._next_segment += 1
+        return path
+
+    def append(self, atoms: List[str], source: str, log: bool = False) -> int:
+        """Append compiled atoms and return the new KB version"""
+        with self._lock:
+            if self._active is None:
+                self._active = self._new_path()
+            with open(self._active, "a") as f:
+                for a in atoms:
+                    if log:
+                        print(a)
+                        print("\n")
+                    f.write(a)
+                    f.write("\n")
+            self.sources.extend((source, a) for a in atoms)
+            self.version += 1
+            version = self.version
+            compact = len(self._segments) > self.max_segments and not self._compacting
+            if compact:
+                self._compacting = True
+        if compact:
+            try:
+                self._compact()
+            except OSError:
+                # The unmerged segments are still complete, so the append itself stands
+                logger.warning("Compacting %s segments failed", self.prefix, exc_info=True)
+        return version
+
+    def snapshot(self) -> KBSnapshot:
+        with self._lock:
+            if self._active is not None:
+                self._segments.append(self._active)
+                self._active = None
+            files = tuple(self._segments)
+            self._refs.update(files)
+            return KBSnapshot(self, files, self.version, len(self.sources))
+
+    def release(self, snap: KBSnapshot):
+        with self._lock:
+            self._refs.subtract(snap.files)
+            for path in snap.files:
+                if self._refs[path] <= 0:
+                    del self._refs[path]
+                    if path in self._retired:
+                        self._retired.discard(path)
+                        self._remove(path)
+
+    @staticmethod
+    def _merge_start(sizes: List[int]) -> int:
+        """Index of the first segment to merge with all newer ones.
+
+        The run grows towards older segments only while the next one is at
+        most twice the size of the run, so a large old segment is only
+        rewritten once the newer data has grown comparable to it.
+        """
+        start = len(sizes) - 2
+        total = sizes[-1] + sizes[-2]
+        while start > 0 and sizes[start - 1] <= 2 * total:
+            start -= 1
+            total += sizes[start]
+        return start
+
+    def _compact(self):
+        # Sealed segments are immutable, so they can be merged without holding the lock
+        with self._lock:
+            segments = list(self._segments)
+            path = self._new_path()
+        try:
+            start = self._merge_start([os.path.getsize(seg) for seg in segments])
+            merged = segments[start:]
+            try:
+                with open(path, "w") as out:
+                    for seg in merged:
+                        with open(seg) as f:
+                            for line in f:
+                                out.write(line)
+            except OSError:
+                self._remove(path)
+                raise
+            with self._lock:
+                # Only this thread compacts and segments are only appended, so the
+                # merged run is still at positions start .. len(segments)
+                self._segments = (self._segments[:start] + [path]
+                                  + self._segments[len(segments):])
+                for seg in merged:
+                    if self._refs[seg] > 0:
+                        self._retired.add(seg)
+                    else:
+                        self._remove(seg)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    @staticmethod
+    def _remove(path: str):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def close(self):
+        with self._lock:
+            for path in set(self._segments) | self._retired | ({self._active} - {None}):
+                self._remove(path)
+            self._segments = []
+            self._retired = set()
+            self._active = None
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import tempfile
+
+METTA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "metta")
+COMPILE_FILE = os.path.join(METTA_DIR, "compile.metta")
+STDLIB_FILE = os.path.join(METTA_DIR, "stdlib.metta")
+
+IMPORT_STDLIB = re.compile(r"^!\(import! &self stdlib\)[ \t]*$", re.MULTILINE)
+
+
+def _form_end(src, pos):
+    """Return the index just past the parenthesised form starting at src[pos]."""
+    depth = 0
+    in_string = False
+    while pos < len(src):
+        c = src[pos]
+        if in_string:
+            if c == '\\':
+                pos += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == ';':
+            while pos < len(src) and src[pos] != '\n':
+                pos += 1
+            continue
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        pos += 1
+    raise ValueError("Unbalanced parentheses in MeTTa source")
+
+
+def strip_tests(src):
+    """Drop top-level !(test ...) assertions, keeping every other form as is."""
+    out = []
+    pos = 0
+    depth = 0
+    in_string = False
+    start = 0
+    while pos < len(src):
+        c = src[pos]
+        if in_string:
+            if c == '\\':
+                pos += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == ';':
+            while pos < len(src) and src[pos] != '\n':
+                pos += 1
+            continue
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif depth == 0 and src.startswith("!(test", pos) and src[pos + 6:pos + 7].isspace():
+            out.append(src[start:pos])
+            pos = _form_end(src, pos + 1)
+            start = pos
+            continue
+        pos += 1
+    out.append(src[start:])
+    return "".join(out)
+
+
+def build_image_source():
+    """Compiler library without self-tests, with stdlib inlined in place of its import."""
+    with open(STDLIB_FILE) as f:
+        stdlib = strip_tests(f.read())
+    with open(COMPILE_FILE) as f:
+        compile_src = strip_tests(f.read())
+    image, count = IMPORT_STDLIB.subn(lambda _m: stdlib, compile_src)
+    if count != 1:
+        raise ValueError(f"Expected one '!(import! &self stdlib)' line in {COMPILE_FILE}, found {count}")
+    return image
+
+
+def cache_dir():
+    return os.environ.get("MM2CHAINER_CACHE_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache", "mm2chainer"))
+
+
+def image_path():
+    """Path of the cached library image, building it if the sources changed.
+
+    The image is keyed by a hash of compile.metta and stdlib.metta, so edits
+    to either file produce a fresh image instead of a stale one.
+    """
+    digest = hashlib.sha256()
+    for path in (COMPILE_FILE, STDLIB_FILE):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    path = os.path.join(cache_dir(), f"compile-{digest.hexdigest()[:16]}.metta")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir(), exist_ok=True)
+        # Write to a temp file first so concurrent processes never load a partial image
+        fd, tmp = tempfile.mkstemp(dir=cache_dir(), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(build_image_source())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    return path
+
+
+if __name__ == '__main__':
+    print(image_path())
@@ -46,6 +46,36 @@ def format_sexpr(sexpr):
         inner = ' '.join(children)
         return f'[{len(sexpr[1])}] {inner}'
 
+def unparse_sexpr(sexpr):
+    if sexpr[0] == 'atom':
+        return sexpr[1]
+    return '(' + ' '.join(unparse_sexpr(e) for e in sexpr[1]) + ')'
+
+def alpha_normalize(sexpr_str):
+    """Rename variables to $_1, $_2, ... in order of first occurrence.
+
+    Two queries that only differ in their variable names normalize to the same string.
+    """
+    parsed, pos = parse_sexpr(sexpr_str, 0)
+    # Skip trailing whitespace
+    while pos < len(sexpr_str) and sexpr_str[pos].isspace():
+        pos += 1
+    if pos < len(sexpr_str):
+        raise ValueError("Extra characters after S-expression")
+    var_to_name = {}
+
+    def rename(node):
+        if node[0] == 'atom':
+            atom = node[1]
+            if atom.startswith('$') and len(atom) > 1:
+                if atom not in var_to_name:
+                    var_to_name[atom] = f'$_{len(var_to_name) + 1}'
+                return ('atom', var_to_name[atom])
+            return node
+        return ('list', [rename(child) for child in node[1]])
+
+    return unparse_sexpr(rename(parsed))
+
 def convert_sexpr(sexpr_str, mode=True):
     parsed, pos = parse_sexpr(sexpr_str, 0)
     # Skip trailing whitespace
@@ -89,3 +119,4 @@ if __name__ == '__main__':
     print(convert_sexpr(test_input, False))
     print(convert_sexpr("(: $prf F $tv)", True))
     print(convert_sexpr("(: $prf F $tv)", False))
+    print(alpha_normalize("(: $prf (Thing $x) $tv)"))
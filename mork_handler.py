@@ -3,107 +3,244 @@ import subprocess
 import time
 import uuid
 import threading
-from typing import List, Tuple
-from helpers.sexpr_converter import convert_sexpr
+from typing import List, Optional, Tuple
+from helpers.sexpr_converter import alpha_normalize, convert_sexpr
+from helpers.query_cache import QueryCache
+from helpers.chainer_profile import (ChainerProfile, FIRED_PATTERN, FIRED_TEMPLATE,
+                                     QUERY_SOURCE, group_sources, src_atoms, statement_name)
+from helpers.metta_image import COMPILE_FILE, image_path
+from helpers.kb_store import KBSnapshot, KBStore
 
-from petta import PeTTa                                                                                                                                                                
 import logging
 
-logging.basicConfig(
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 LOADEDLIB = False
 LOADED_LOCK = threading.Lock()
+# The compiler keeps global state (the ctx space and ctxid counter), so all
+# PeTTa calls are serialized; mork runs themselves proceed in parallel.
+PETTA_LOCK = threading.RLock()
+
+MM2_DIR = os.path.join(os.path.dirname(__file__), "mm2")
+CHAINER_FILE = os.path.join(MM2_DIR, "chainer.mm2")
+PROFILE_CHAINER_FILE = os.path.join(MM2_DIR, "chainer_profile.mm2")
+MATHRELS_FILE = os.path.join(MM2_DIR, "mathrels.mm2")
+# exec driver and CPU functions, loaded together with either chainer
+RUNTIME_FILE = os.path.join(MM2_DIR, "runtime.mm2")
+
+# A mork run taking at least this fraction of its --timeout is assumed to have
+# been cut off, and its possibly partial results are not cached
+TIMEOUT_FRACTION = 0.95
+
+def production_mode() -> bool:
+    return os.environ.get("MM2CHAINER_PRODUCTION", "").lower() in ("1", "true", "yes")
+
 
 class MorkHandler:                                                          
-    def __init__(self):
+    """Compiles statements into an mm2 KB and answers queries with mork.
+
+    A handler can be shared between threads. Each query runs against a
+    snapshot of the KB with its own scratch and output files, while add_atom
+    calls are serialized and only briefly block snapshotting.
+    """
+
+    def __init__(self, cache_size: int = 128, cache_ttl: Optional[float] = None,
+                 production: Optional[bool] = None):
+        """Create a handler with its own KB
+
+        Args:
+            cache_size: Maximum number of cached query results, 0 disables the cache
+            cache_ttl: Seconds a cached result stays valid, None for no limit
+            production: Load the compiler library from the cached image without its
+                !(test ...) self-checks. Defaults to the MM2CHAINER_PRODUCTION env var.
+                Only the first handler in a process loads the library.
+        """
         global LOADEDLIB
-        self.handler = PeTTa()
+        # Imported here so importing this module stays cheap
+        from petta import PeTTa
+        with PETTA_LOCK:
+            self.handler = PeTTa()
         
         self.kb = "kb" + uuid.uuid4().hex
 
         if not LOADEDLIB:
             with LOADED_LOCK:
                 if not LOADEDLIB:
-                    src_path = os.path.join(os.path.dirname(__file__),"metta/compile.metta")
-                    print(src_path)
-                    self.handler.load_metta_file(src_path)
+                    if production is None:
+                        production = production_mode()
+                    src_path = image_path() if production else COMPILE_FILE
+                    logger.info("Loading compiler library from %s", src_path)
+                    with PETTA_LOCK:
+                        self.handler.load_metta_file(src_path)
                     LOADEDLIB = True
 
-        self.data_file = f"data_{self.kb}.mm2"
-        self.out_file = f"out_{self.kb}.mm2"
-        with open(self.data_file, "w") as f:
-            f.write("")
+        self.store = KBStore(f"data_{self.kb}")
+        self.cache = QueryCache(cache_size, cache_ttl)
+        self._write_lock = threading.Lock()
 
     def __del__(self):
-        if os.path.exists(self.data_file):
-            os.remove(self.data_file)
-        if os.path.exists(self.out_file):
-            os.remove(self.out_file)
+        store = getattr(self, "store", None)
+        if store is not None:
+            store.close()
+
+    @property
+    def kb_version(self) -> int:
+        """Bumped by add_atom so cached query results never outlive the KB they came from"""
+        return self.store.version
+
+    @property
+    def sources(self) -> List[Tuple[str, str]]:
+        """(statement name, compiled atom) for every atom in the KB"""
+        return self.store.sources
 
     def add_atom(self, atom: str, log:bool=False, timeout: float = 240) -> str:
-        atoms = self.handler.process_metta_string(f"!(mm2compile {self.kb} {atom})")
-        if len(atoms) == 0:
-            if log:
-                print(f"No atoms found for {atom}")
-            return
-        with open(self.data_file, "a") as f:
-            for a in atoms:
+        with self._write_lock:
+            atoms = self._compile(f"!(mm2compile {self.kb} {atom})")
+            if len(atoms) == 0:
                 if log:
-                    print(a)
-                    print("\n")
-                f.write(a)
-                f.write("\n")
+                    print(f"No atoms found for {atom}")
+                return
+            self.store.append(atoms, statement_name(atom), log)
         return atoms
 
-    def query(self, atom: str, log: bool = False, timeout: int = 3) -> List[str]:
+    def _compile(self, metta: str) -> List[str]:
+        with PETTA_LOCK:
+            return self.handler.process_metta_string(metta)
+
+    def query(self, atom: str, log: bool = False, timeout: int = 3, use_cache: bool = True) -> List[str]:
         """Query the knowledge base and return results
-        
+
+        Results are cached per KB version, so repeating a question that only
+        differs in variable names skips compilation and the mork run. Runs
+        that hit the timeout may be incomplete and are not cached.
+
         Args:
             atom: The atom to query
             log: Whether to log the output
             timeout: Maximum time in seconds to wait for completion
+            use_cache: Set to False to neither read nor store a cached result
             
         Returns:
-            Tuple of (results_list, proven_boolean)
+            List of result atoms
         """
-        atoms = self.handler.process_metta_string(f"!(mm2compileQuery {self.kb} {atom})")
-        with open(self.data_file, "a") as f:
-            for a in atoms:
+        canonical = alpha_normalize(atom)
+        if use_cache:
+            results = self.cache.get((self.kb_version, canonical, int(timeout)))
+            if results is not None:
                 if log:
-                    print(a)
-                    print("\n")
-                f.write(a)
-                f.write("\n")
+                    print(f"Cache hit for {atom}")
+                return results
+
+        with self.store.snapshot() as snap:
+            key = (snap.version, canonical, int(timeout))
+            atoms = self._compile_query(atom, log)
+            start = time.perf_counter()
+            results = self._run(snap, atoms, log, timeout)
+            elapsed = time.perf_counter() - start
+        if elapsed >= TIMEOUT_FRACTION * int(timeout):
+            logger.info("Query hit the %ss timeout, not caching: %s", int(timeout), atom)
+        elif use_cache:
+            self.cache.put(key, results)
+        return results
+
+    def profile_query(self, atom: str, log: bool = False, timeout: int = 3) -> Tuple[List[str], ChainerProfile]:
+        """Query the knowledge base and profile which chainer rules fire
+
+        The query is run as usual and then a second time with the profiling
+        chainer, which records every step firing together with the statement
+        (as passed to add_atom) that drove it.
 
+        The profiling chainer is not the exact run that run_time measures:
+        its base step additionally joins every goal with a (src ...) atom to
+        find the statement, and abs1 joins each rule with its (src ...) atom.
+        That run does more work and is not timed; run_time is the plain run,
+        the counts come from the profiling run.
+
+        Args:
+            atom: The atom to query
+            log: Whether to log the output
+            timeout: Maximum time in seconds to wait for each run
+
+        Returns:
+            Tuple of (results_list, profile)
+        """
+        with self.store.snapshot() as snap:
+            start = time.perf_counter()
+            atoms = self._compile_query(atom, log)
+            compile_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = self._run(snap, atoms, log, timeout)
+            run_time = time.perf_counter() - start
+
+            groups = group_sources(snap.sources() + [(QUERY_SOURCE, a) for a in atoms])
+            # KB atoms come from the snapshot files, the scratch file adds the query and src atoms
+            trace = self._run_mork(PROFILE_CHAINER_FILE, snap.files,
+                                   atoms + src_atoms(groups),
+                                   FIRED_PATTERN, FIRED_TEMPLATE, log, timeout)
+
+        profile = ChainerProfile.from_trace(atom, trace, groups, compile_time, run_time)
+        return results, profile
+
+    def _compile_query(self, atom: str, log: bool = False) -> List[str]:
+        atoms = self._compile(f"!(mm2compileQuery {self.kb} {atom})")
+        if log:
+            for a in atoms:
+                print(a)
+                print("\n")
+        return atoms
+
+    def _run(self, snap: KBSnapshot, atoms: List[str], log: bool, timeout: int) -> List[str]:
         p_arg = convert_sexpr(atoms[0], True).replace("goal", "ev")
         t_arg = convert_sexpr(atoms[0], False).replace("goal", "ev")
-        chainer_file = os.path.join(os.path.dirname(__file__), "mm2" , "chainer.mm2")
-        mathrels_file = os.path.join(os.path.dirname(__file__), "mm2" , "mathrels.mm2")
+        if log:
+            print(atoms)
+        return self._run_mork(CHAINER_FILE, snap.files, atoms, p_arg, t_arg, log, timeout)
+
+    def _run_mork(self, chainer_file: str, data_files: Tuple[str, ...], scratch: List[str],
+                  p_arg: str, t_arg: str, log: bool, timeout: int) -> List[str]:
+        """Run mork on the given KB files plus a per-run scratch file holding `scratch`"""
+        run_id = uuid.uuid4().hex
+        scratch_file = f"query_{self.kb}_{run_id}.mm2"
+        out_file = f"out_{self.kb}_{run_id}.mm2"
+        try:
+            with open(scratch_file, "w") as f:
+                for a in scratch:
+                    f.write(a)
+                    f.write("\n")
+            return self._run_mork_files(chainer_file, list(data_files) + [scratch_file],
+                                        out_file, p_arg, t_arg, log, timeout)
+        finally:
+            for path in (scratch_file, out_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _run_mork_files(self, chainer_file: str, data_files: List[str], out_file: str,
+                        p_arg: str, t_arg: str, log: bool, timeout: int) -> List[str]:
         cmd = [
             "mork", "run",
             #"--steps", "3000",
-            chainer_file, mathrels_file, self.data_file,
-            "-o", self.out_file,
+            chainer_file, RUNTIME_FILE, MATHRELS_FILE, *data_files,
+            "-o", out_file,
             "-p", p_arg,
             "-t", t_arg,
             "--timeout", str(int(timeout))
         ]
         if log:
-            print(atoms)
             print(cmd)
         result = subprocess.run(cmd, capture_output=True, text=True)
         if result.returncode != 0:
             raise RuntimeError(f"mork run failed with return code {result.returncode}: {result.stderr}")
 
-        with open(self.out_file, "r") as f:
+        with open(out_file, "r") as f:
             results = f.read().splitlines()
         return results
 
 if __name__ == '__main__':
+    logging.basicConfig(
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        level=logging.INFO
+    )
     handler = MorkHandler()
 
     print("Test")
@@ -0,0 +1,31 @@
+import os
+
+from helpers.sexpr_converter import parse_sexpr, unparse_sexpr
+
+MM2_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mm2")
+
+
+def read_forms(name):
+    with open(os.path.join(MM2_DIR, name)) as f:
+        src = "".join(line for line in f if not line.lstrip().startswith(";"))
+    forms = []
+    pos = 0
+    while src[pos:].strip():
+        form, pos = parse_sexpr(src, pos)
+        forms.append(form)
+    return forms
+
+
+def strip_profiling(step):
+    """Drop the (src ...) joins and (fired ...) outputs added by chainer_profile.mm2"""
+    _tag, (head, (_, pattern), (_, template)) = step
+    pattern = [e for e in pattern if not (e[0] == 'list' and e[1][0] == ('atom', 'src'))]
+    template = [e for e in template if not (e[0] == 'list' and e[1][0] == ('atom', 'fired'))]
+    return unparse_sexpr(('list', [head, ('list', pattern), ('list', template)]))
+
+
+def test_profile_chainer_matches_chainer():
+    steps = [unparse_sexpr(f) for f in read_forms("chainer.mm2")]
+    profiled = [strip_profiling(f) for f in read_forms("chainer_profile.mm2")]
+
+    assert profiled == steps
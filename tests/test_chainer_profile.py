@@ -0,0 +1,61 @@
+from helpers.chainer_profile import ChainerProfile, group_sources, src_atoms
+
+SOURCES = [("r1", "(rules r1)"), ("r2", "(rules r2)"), ("f", "(: kb f (P x) (STV 1.0 1.0))")]
+
+# abs1 r1 -> abs1 r2 -> base f, with MORK naming the same goal differently per position
+TRACE = [
+    "(fired abs1 0 (: kb $a (R x) $b) (: kb $c (Q x) $d))",
+    "(fired abs1 1 (: kb $e (Q x) $f) (: kb $g (P x) $h))",
+    "(fired base 2 (: kb $i (P x) $j) -)",
+]
+
+
+def test_from_trace_links_renamed_goals():
+    profile = ChainerProfile.from_trace("q", TRACE, group_sources(SOURCES))
+
+    assert profile.folded_stacks() == {
+        "query;abs1:r1": 1,
+        "query;abs1:r1;abs1:r2": 1,
+        "query;abs1:r1;abs1:r2;base:f": 1,
+    }
+
+
+def test_from_trace_counts():
+    report = ChainerProfile.from_trace("q", TRACE, group_sources(SOURCES)).to_dict()
+
+    assert report["steps"] == {"abs1": 2, "base": 1}
+    assert report["rules"] == {"r1": 1, "r2": 1, "f": 1}
+    assert report["goals"] == 2
+    assert report["goal_fanout"] == {"(: kb $_1 (R x) $_2)": 1, "(: kb $_1 (Q x) $_2)": 1}
+
+
+def test_shared_atoms_get_one_src_and_fire_once():
+    # Both statements emit the same conjunction rule, only the variable names differ
+    sources = [
+        ("s1", "(rules ((: kb $_1 A $_2) Nil) |- (: kb $_1 (And A B) $_2))"),
+        ("s2", "(rules ((: kb $_7 A $_8) Nil) |- (: kb $_7 (And A B) $_8))"),
+        ("s2", "(: kb s2 C (STV 1.0 1.0))"),
+    ]
+    groups = group_sources(sources)
+
+    assert len(src_atoms(groups)) == 2
+    assert groups[0][1] == ["s1", "s2"]
+
+    trace = ["(fired abs1 0 (: kb $a (And A B) $b) (: kb $c A $d))"]
+    report = ChainerProfile.from_trace("q", trace, groups).to_dict()
+
+    assert report["steps"] == {"abs1": 1}
+    assert report["rule_fanout"] == {"abs1:s1|s2": 1}
+    assert report["rules"] == {"s1": 1, "s2": 1}
+
+
+def test_cpu_functions_are_counted_apart_from_statements():
+    groups = group_sources([("Mp-formula", "(: kb Mp-formula X (STV 1.0 1.0))")])
+    trace = [
+        "(fired cpu Mp-formula (CPU Mp-formula ((STV 1.0 1.0) (STV 1.0 1.0)) $r) -)",
+        "(fired base 0 (: kb $a X $b) -)",
+    ]
+    report = ChainerProfile.from_trace("q", trace, groups).to_dict()
+
+    assert report["functions"] == {"Mp-formula": 1}
+    assert report["rules"] == {"Mp-formula": 1}
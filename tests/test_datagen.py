@@ -0,0 +1,145 @@
+import json
+
+import pytest
+
+from helpers import datagen
+from helpers.sexpr_converter import parse_sexpr, unparse_sexpr
+
+
+def to_term(node):
+    if node[0] == 'atom':
+        return node[1]
+    return tuple(to_term(e) for e in node[1])
+
+
+def read_kb(path):
+    """Split the emitted statements into ground facts, rules and stated implications."""
+    facts, rules, implications = set(), [], set()
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(";"):
+                continue
+            parsed, _ = parse_sexpr(line, 0)
+            _colon, _name, stmt, _tv = parsed[1]
+            term = to_term(stmt)
+            if term[0] == "Implication":
+                implications.add(unparse_sexpr(stmt))
+                body, head = term[1], term[2]
+                premises = list(body[1:]) if body[0] in ("And", "Or") else [body]
+                rules.append((premises, head))
+            else:
+                facts.add(term)
+    return facts, rules, implications
+
+
+def is_var(t):
+    return isinstance(t, str) and t.startswith("$")
+
+
+def match(pattern, fact, bindings):
+    if len(pattern) != len(fact):
+        return None
+    bindings = dict(bindings)
+    for p, v in zip(pattern, fact):
+        if is_var(p):
+            if bindings.setdefault(p, v) != v:
+                return None
+        elif p != v:
+            return None
+    return bindings
+
+
+def substitute(term, bindings):
+    return tuple(bindings.get(t, t) for t in term)
+
+
+def unparse(term):
+    if isinstance(term, str):
+        return term
+    return "(" + " ".join(unparse(t) for t in term) + ")"
+
+
+def forward_chain(facts, rules, implications):
+    """Naive fixed point; Or needs every disjunct like the compiler, nested Implications must be stated."""
+    facts = set(facts)
+    while True:
+        new = set()
+        for premises, head in rules:
+            solutions = [{}]
+            for premise in premises:
+                if premise[0] == "Implication":
+                    if unparse(premise) not in implications:
+                        solutions = []
+                    continue
+                solutions = [b2 for b in solutions for f in facts
+                             if (b2 := match(premise, f, b)) is not None]
+            new.update(substitute(head, b) for b in solutions)
+        if new <= facts:
+            return facts
+        facts |= new
+
+
+def query_term(query):
+    parsed, _ = parse_sexpr(query, 0)
+    return to_term(parsed)[2]
+
+
+ARGS = ["--individuals", "30", "--predicates", "12", "--depth", "3", "--fanin-max", "3",
+        "--or-rate", "0.4", "--nested-rate", "0.5", "--recursion", "--chain-length", "5",
+        "--ground-queries", "40", "--open-queries", "8"]
+
+
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_expected_answers_match_forward_chaining(tmp_path, seed):
+    kb, queries = tmp_path / "kb.metta", tmp_path / "queries.jsonl"
+    datagen.main(ARGS + ["--seed", str(seed), "-o", str(kb), "--queries", str(queries)])
+
+    facts, rules, implications = read_kb(kb)
+    # The KB exercises Or rules and nested Implication premises
+    assert any("(Implication (Or " in i for i in implications)
+    assert any(i.count("Implication") > 1 for i in implications)
+    derived = forward_chain(facts, rules, implications)
+
+    outcomes = set()
+    with open(queries) as f:
+        entries = [json.loads(line) for line in f]
+    assert entries
+    for entry in entries:
+        term = query_term(entry["query"])
+        if entry["kind"] == "ground":
+            assert entry["expected"] == (term in derived), entry
+            outcomes.add(entry["expected"])
+        else:
+            var = next(t for t in term if is_var(t))
+            answers = sorted((b[var] for f in derived if (b := match(term, f, {})) is not None),
+                             key=lambda name: int(name[len("ind"):]))
+            assert entry["count"] == len(answers), entry
+            assert entry["expected"] == answers, entry
+    assert outcomes == {True, False}
+
+
+def test_long_answer_lists_are_omitted(tmp_path):
+    queries = tmp_path / "queries.jsonl"
+    datagen.main(["--individuals", "40", "--fact-rate-min", "0.9", "--fact-rate-max", "1.0",
+                  "--max-answers", "2", "--ground-queries", "0", "--open-queries", "3",
+                  "-o", str(tmp_path / "kb.metta"), "--queries", str(queries)])
+
+    with open(queries) as f:
+        entries = [json.loads(line) for line in f]
+    for entry in entries:
+        assert ("expected" in entry) == (entry["count"] <= 2)
+
+
+@pytest.mark.parametrize("argv, message", [
+    (["--individuals", "0"], "--individuals must be at least 1"),
+    (["--depth", "-1"], "--depth must not be negative"),
+    (["--predicates", "3", "--depth", "3"], "--predicates must be at least --depth + 1"),
+    (["--fanin-min", "0"], "need 1 <= --fanin-min <= --fanin-max"),
+    (["--fanin-min", "4", "--fanin-max", "2"], "need 1 <= --fanin-min <= --fanin-max"),
+    (["--chain-length", "1"], "--chain-length must be at least 2"),
+])
+def test_parse_args_rejects_invalid_options(capsys, argv, message):
+    with pytest.raises(SystemExit):
+        datagen.parse_args(argv)
+    assert message in capsys.readouterr().err
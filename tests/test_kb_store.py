@@ -0,0 +1,102 @@
+import os
+import threading
+
+from helpers.kb_store import KBStore
+
+
+def read_atoms(files):
+    atoms = []
+    for path in files:
+        with open(path) as f:
+            atoms.extend(f.read().splitlines())
+    return atoms
+
+
+def test_snapshot_is_isolated_from_later_appends(tmp_path):
+    store = KBStore(str(tmp_path / "kb"))
+    store.append(["(a 1)"], "s1")
+
+    with store.snapshot() as snap:
+        store.append(["(a 2)"], "s2")
+        assert read_atoms(snap.files) == ["(a 1)"]
+        assert snap.version == 1
+        assert snap.sources() == [("s1", "(a 1)")]
+
+    with store.snapshot() as snap:
+        assert sorted(read_atoms(snap.files)) == ["(a 1)", "(a 2)"]
+        assert snap.version == 2
+    store.close()
+
+
+def seal(store):
+    with store.snapshot():
+        pass
+
+
+def test_snapshot_does_not_compact(tmp_path):
+    store = KBStore(str(tmp_path / "kb"), max_segments=10)
+    for i in range(4):
+        store.append([f"(a {i})"], "s")
+        seal(store)
+    store.max_segments = 2
+
+    with store.snapshot() as snap:
+        assert len(snap.files) == 4
+    store.close()
+
+
+def test_append_compacts_and_retired_files_wait_for_last_release(tmp_path):
+    store = KBStore(str(tmp_path / "kb"), max_segments=2)
+    for i in range(3):
+        store.append([f"(a {i})"], "s")
+        seal(store)
+
+    old = store.snapshot()
+    store.append(["(a 3)"], "s")  # more than two sealed segments, so the writer merges them
+
+    with store.snapshot() as snap:
+        assert len(snap.files) < len(old.files)
+        assert sorted(read_atoms(snap.files)) == ["(a 0)", "(a 1)", "(a 2)", "(a 3)"]
+    assert all(os.path.exists(path) for path in old.files)
+    assert sorted(read_atoms(old.files)) == ["(a 0)", "(a 1)", "(a 2)"]
+
+    store.release(old)
+    with store.snapshot() as snap:
+        live = set(snap.files)
+    assert [path for path in old.files if os.path.exists(path)] == [p for p in old.files if p in live]
+    store.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_merge_start_keeps_large_old_segments():
+    assert KBStore._merge_start([1000, 1, 1, 1]) == 1
+    assert KBStore._merge_start([3, 1, 1, 1]) == 0
+    assert KBStore._merge_start([5, 5]) == 0
+
+
+def test_concurrent_snapshots_see_whole_appends(tmp_path):
+    store = KBStore(str(tmp_path / "kb"), max_segments=3)
+    errors = []
+
+    def writer(n):
+        for i in range(200):
+            store.append([f"(a {n} {i})", f"(b {n} {i})"], "s")
+
+    def reader():
+        for _ in range(200):
+            with store.snapshot() as snap:
+                if len(read_atoms(snap.files)) != snap.num_sources:
+                    errors.append(snap.version)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(2)]
+    threads += [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with store.snapshot() as snap:
+        assert len(read_atoms(snap.files)) == 800
+    store.close()
+    assert os.listdir(tmp_path) == []
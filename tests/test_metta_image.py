@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from helpers import metta_image
+
+
+def test_strip_tests_keeps_other_forms():
+    src = '(= (f $x) $x)\n!(test (f (g ")")) ")")\n!(change-state! ctxid 0)\n; !(test kept comment)\n'
+
+    assert metta_image.strip_tests(src) == '(= (f $x) $x)\n\n!(change-state! ctxid 0)\n; !(test kept comment)\n'
+
+
+def test_image_inlines_stdlib_without_tests():
+    image = metta_image.build_image_source()
+
+    assert "!(test" not in image
+    assert "!(add-atom" not in image
+    assert "!(import! &self stdlib)" not in image
+    assert "(= (map-flat $f ()) ())" in image
+
+
+def test_missing_stdlib_import_raises(tmp_path, monkeypatch):
+    compile_file = tmp_path / "compile.metta"
+    compile_file.write_text("!(import! &self other)\n")
+    monkeypatch.setattr(metta_image, "COMPILE_FILE", str(compile_file))
+
+    with pytest.raises(ValueError):
+        metta_image.build_image_source()
+
+
+def test_failed_image_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("MM2CHAINER_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(metta_image, "build_image_source", lambda: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError):
+        metta_image.image_path()
+    assert os.listdir(tmp_path) == []
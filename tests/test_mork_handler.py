@@ -0,0 +1,76 @@
+import sys
+import types
+
+import pytest
+
+import mork_handler
+
+
+class FakePeTTa:
+    def load_metta_file(self, path):
+        pass
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(sys.modules, "petta", types.SimpleNamespace(PeTTa=FakePeTTa))
+    monkeypatch.setattr(mork_handler, "LOADEDLIB", True)
+
+    clock = [0.0]
+    runs = []
+    monkeypatch.setattr(mork_handler.time, "perf_counter", lambda: clock[0])
+
+    h = mork_handler.MorkHandler()
+    h.run_seconds = 0.0
+    h.runs = runs
+    monkeypatch.setattr(h, "_compile", lambda metta: [metta])
+    monkeypatch.setattr(h, "_compile_query", lambda atom, log=False: [atom])
+
+    def fake_run(snap, atoms, log, timeout):
+        runs.append(atoms[0])
+        clock[0] += h.run_seconds
+        return [f"result {len(runs)}"]
+
+    monkeypatch.setattr(h, "_run", fake_run)
+    yield h
+    h.store.close()
+
+
+def test_renamed_query_is_a_cache_hit(handler):
+    handler.add_atom("(: a A (STV 1.0 1.0))")
+
+    first = handler.query("(: $prf A $tv)")
+    second = handler.query("(: $p A  $t)")
+
+    assert first == second == ["result 1"]
+    assert len(handler.runs) == 1
+    assert handler.cache.stats()["hits"] == 1
+
+
+def test_add_atom_invalidates_cached_results(handler):
+    handler.query("(: $prf A $tv)")
+    handler.add_atom("(: a A (STV 1.0 1.0))")
+
+    assert handler.query("(: $prf A $tv)") == ["result 2"]
+    assert len(handler.runs) == 2
+
+
+def test_timed_out_runs_are_not_cached(handler):
+    handler.run_seconds = mork_handler.TIMEOUT_FRACTION * 3
+    handler.query("(: $prf A $tv)", timeout=3)
+    handler.query("(: $prf A $tv)", timeout=3)
+    assert len(handler.runs) == 2
+
+    handler.run_seconds = 0.1
+    handler.query("(: $prf A $tv)", timeout=3)
+    handler.query("(: $prf A $tv)", timeout=3)
+    assert len(handler.runs) == 3
+
+
+def test_trailing_input_is_rejected(handler):
+    handler.query("(: $prf A $tv)")
+
+    with pytest.raises(ValueError):
+        handler.query("(: $prf A $tv) junk")
+    assert len(handler.runs) == 1
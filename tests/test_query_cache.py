@@ -0,0 +1,47 @@
+from helpers import query_cache
+from helpers.query_cache import QueryCache
+
+
+def test_lru_eviction():
+    cache = QueryCache(maxsize=2)
+    cache.put("a", ["1"])
+    cache.put("b", ["2"])
+    assert cache.get("a") == ["1"]  # a is now the most recently used
+    cache.put("c", ["3"])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == ["1"]
+    assert cache.get("c") == ["3"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(maxsize=4, ttl=10)
+    cache.put("a", ["1"])
+
+    now[0] = 109.0
+    assert cache.get("a") == ["1"]
+    now[0] = 111.0
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (1, 1, 1, 0)
+
+
+def test_results_are_copied():
+    cache = QueryCache()
+    results = ["1"]
+    cache.put("a", results)
+    results.append("2")
+    cache.get("a").append("3")
+
+    assert cache.get("a") == ["1"]
+
+
+def test_zero_size_disables_cache():
+    cache = QueryCache(maxsize=0)
+    cache.put("a", ["1"])
+
+    assert cache.get("a") is None
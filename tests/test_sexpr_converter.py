@@ -0,0 +1,24 @@
+import pytest
+
+from helpers.sexpr_converter import alpha_normalize, convert_sexpr
+
+
+def test_alpha_normalize_ignores_variable_names():
+    assert alpha_normalize("(: $prf (Thing $x) $tv)") == alpha_normalize("(: $p (Thing $y)  $t)")
+    assert alpha_normalize("(: $prf (Thing $x) $tv)") == "(: $_1 (Thing $_2) $_3)"
+
+
+def test_alpha_normalize_keeps_variable_sharing():
+    assert alpha_normalize("(R $a $b $a)") == "(R $_1 $_2 $_1)"
+    assert alpha_normalize("(R $a $b $a)") != alpha_normalize("(R $a $b $b)")
+
+
+def test_convert_sexpr():
+    assert convert_sexpr("(ev $a $b $a)", True) == "[4] ev $ $ _1"
+    assert convert_sexpr("(ev $a $b $a)", False) == "[4] ev _1 _2 _1"
+
+
+def test_alpha_normalize_rejects_trailing_input():
+    with pytest.raises(ValueError):
+        alpha_normalize("(: $p A $tv) junk")
+    assert alpha_normalize("(: $p A $tv)  \n") == "(: $_1 A $_2)"